@@ -7,12 +7,45 @@ This demonstrates how to use Cortex Memory in your AI agent:
 2. Use memories as context for better responses
 3. Extract and save new memories automatically
 """
-import subprocess
+import sys
 import json
-import re
-from typing import List, Dict
+import time
+import queue
+import atexit
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+# Import the retrieval skill in-process instead of spawning a script per query
+sys.path.append(str(Path(__file__).resolve().parent.parent / "skills" / "retrieve-memory" / "scripts"))
+from retrieve_memory import clear_search_cache, search
 
-def retrieve_memories(query: str, limit: int = 5) -> List[Dict]:
+@dataclass
+class MemoryHits:
+    """
+    Retrieved memories as parallel arrays: hit i is (similarities[i], summaries[i], dates[i]).
+
+    similarities holds the cosine similarity (0-1) of semantic hits and NaN for
+    keyword-only hits; the fused RRF score only orders results and is not kept.
+    """
+    similarities: np.ndarray
+    summaries: List[str]
+    dates: List[str]
+
+    def __len__(self) -> int:
+        return len(self.summaries)
+
+    def mean_similarity(self) -> float:
+        """Average similarity of the semantic hits (vectorized), 0.0 when there are none"""
+        semantic = self.similarities[~np.isnan(self.similarities)]
+        return float(semantic.mean()) if semantic.size else 0.0
+
+
+def retrieve_memories(query: str, limit: int = 5) -> MemoryHits:
     """
     Retrieve relevant memories from Cortex.
 
@@ -21,48 +54,143 @@ def retrieve_memories(query: str, limit: int = 5) -> List[Dict]:
         limit: Number of results to return
 
     Returns:
-        List of memory dictionaries with 'date', 'summary', 'score', etc.
+        MemoryHits with the similarity, summary and date of each result (in rank order)
     """
     try:
-        result = subprocess.run(
-            ["python3", "scripts/retrieve_memory.py",
-             "--query", query,
-             "--limit", str(limit)],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        # Parse output
-        # Format: "1. [semantic] TYPE - Score: 0.863\n   📅 2026-02-05\n   📝 summary..."
-        memories = []
-        lines = result.stdout.split('\n')
-
-        current_memory = {}
-        for line in lines:
-            if re.match(r'^\d+\. \[', line):
-                # New result
-                if current_memory:
-                    memories.append(current_memory)
-
-                # Parse score
-                score_match = re.search(r'Score: ([\d.]+)', line)
-                current_memory = {
-                    'score': float(score_match.group(1)) if score_match else 0.0
-                }
-            elif line.strip().startswith('📅'):
-                current_memory['date'] = line.split('📅')[1].strip()
-            elif line.strip().startswith('📝'):
-                current_memory['summary'] = line.split('📝')[1].strip()
-
-        if current_memory:
-            memories.append(current_memory)
-
-        return memories
-
+        results = search(query, limit)
     except Exception as e:
         print(f"⚠️  Failed to retrieve memories: {e}")
-        return []
+        results = []
+
+    similarities, summaries, dates = [], [], []
+    for r in results:
+        similarities.append(r.get('score', np.nan) if r.get('source') == 'semantic' else np.nan)
+        summaries.append(r.get('summary', ''))
+        dates.append(r.get('date', 'unknown'))
+
+    return MemoryHits(np.array(similarities, dtype=np.float64), summaries, dates)
+
+
+class ClaudeWorker:
+    """
+    Claude CLI process kept ready to accept a prompt over stdin.
+
+    Runs `claude -p` with stream-json input/output. A process serves
+    `prompts_per_process` prompts and is then replaced by a fresh one that
+    starts up (model init, auth, config parsing) while the caller carries on;
+    the old one is shut down in the background.
+
+    The default of 1 gives every prompt a clean conversation, so it still
+    spawns one CLI per prompt; it only takes startup off the critical path
+    (after the first prompt), and the spare process started after the last
+    prompt sits idle until close(). Raising prompts_per_process reuses a
+    process for several prompts, trading context isolation (earlier prompts
+    stay in the conversation, which grows in size and cost) for fewer spawns.
+
+    A prompt with no result within `timeout` seconds kills the process.
+    Calls from multiple threads are serialized.
+    """
+
+    def __init__(self, timeout: float = 60, prompts_per_process: int = 1):
+        self.timeout = timeout
+        self.prompts_per_process = prompts_per_process
+        self.process = None
+        self.lines = None
+        self.prompts_sent = 0
+        self.lock = threading.Lock()
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            ["claude",
+             "-p",
+             "--input-format", "stream-json",
+             "--output-format", "stream-json",
+             "--verbose",
+             "--dangerously-skip-permissions"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=-1
+        )
+        # A reader thread feeds stdout lines into a queue so reads can time out
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=self._read_lines, args=(self.process.stdout, self.lines), daemon=True
+        ).start()
+        self.prompts_sent = 0
+
+    @staticmethod
+    def _read_lines(stream, lines: queue.Queue):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)  # EOF
+
+    @classmethod
+    def _retire(cls, process):
+        """Shut a process down on a daemon thread without blocking the caller"""
+        threading.Thread(target=cls._stop, args=(process,), daemon=True).start()
+
+    @staticmethod
+    def _stop(process, kill: bool = False):
+        if process is None or process.poll() is not None:
+            return
+        if kill:
+            process.kill()
+        else:
+            process.stdin.close()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def send(self, prompt: str) -> bool:
+        """Send one prompt and wait for its result message; True on success"""
+        message = {
+            "type": "user",
+            "message": {"role": "user", "content": prompt}
+        }
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+            self.prompts_sent += 1
+
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self._stop(self.process, kill=True)
+                    self.process = None
+                    raise TimeoutError(f"Claude worker returned no result within {self.timeout}s")
+                if line is None:
+                    self.process = None
+                    raise RuntimeError("Claude worker exited before returning a result")
+
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if data.get("type") != "result":
+                    continue
+
+                # Swap in a fresh process so the next prompt starts from a clean context
+                if self.prompts_sent >= self.prompts_per_process:
+                    old_process = self.process
+                    self._start()
+                    self._retire(old_process)
+                return not data.get("is_error", False)
+
+    def close(self):
+        with self.lock:
+            self._stop(self.process)
+            self.process = None
+
+
+_claude_worker = ClaudeWorker()
+atexit.register(_claude_worker.close)
 
 
 def extract_memory(content: str, memory_type: str = "note") -> bool:
@@ -77,15 +205,15 @@ def extract_memory(content: str, memory_type: str = "note") -> bool:
         True if successful
     """
     try:
-        # Call Claude CLI with extract-memory skill
+        # Send to the shared Claude CLI worker with extract-memory skill
         # (Assumes you have the skill installed)
-        subprocess.run(
-            ["claude",
-             "-p", f"Extract and save this to memory:\n{content}\n\nType: {memory_type}",
-             "--dangerously-skip-permissions"],
-            timeout=60
+        saved = _claude_worker.send(
+            f"Extract and save this to memory:\n{content}\n\nType: {memory_type}"
         )
-        return True
+        if saved:
+            # Cached search results predate this write
+            clear_search_cache()
+        return saved
     except Exception as e:
         print(f"⚠️  Failed to extract memory: {e}")
         return False
@@ -111,8 +239,8 @@ def agent_think(user_input: str) -> str:
     context = ""
     if memories:
         context = "## Relevant past knowledge:\n"
-        for i, mem in enumerate(memories, 1):
-            context += f"{i}. [{mem.get('date', 'unknown')}] {mem.get('summary', '')[:100]}\n"
+        for i, (date, summary) in enumerate(zip(memories.dates, memories.summaries), 1):
+            context += f"{i}. [{date}] {summary[:100]}\n"
         print(f"✅ Found {len(memories)} relevant memories")
     else:
         print("ℹ️  No relevant memories found")
@@ -179,5 +307,5 @@ if __name__ == "__main__":
     print("Example 3: Verify saved knowledge")
     print("=" * 60)
     memories = retrieve_memories("embedding model", limit=2)
-    for mem in memories:
-        print(f"  - {mem.get('summary', '')[:80]}...")
+    for summary in memories.summaries:
+        print(f"  - {summary[:80]}...")
@@ -8,8 +8,9 @@ This demonstrates:
 3. Coordinated knowledge building
 """
 import subprocess
-from typing import List, Dict
-from basic_agent import retrieve_memories, extract_memory
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Dict, Optional
+from basic_agent import MemoryHits, retrieve_memories, extract_memory
 
 
 class Agent:
@@ -37,12 +38,12 @@ class Agent:
 
         return response
 
-    def _build_context(self, memories: List[Dict]) -> str:
+    def _build_context(self, memories: MemoryHits) -> str:
         """Build context from memories"""
         if not memories:
             return "No prior knowledge"
 
-        return "; ".join([m.get('summary', '')[:50] for m in memories])
+        return "; ".join([summary[:50] for summary in memories.summaries])
 
     def _save_insight(self, task: str, response: str):
         """Save agent's insight to shared memory"""
@@ -69,15 +70,15 @@ class ResearchAgent(Agent):
             print(f"✅ Found {len(memories)} relevant memories")
             return {
                 "topic": topic,
-                "findings": [m.get('summary', '') for m in memories],
-                "confidence": sum(m.get('score', 0) for m in memories) / len(memories)
+                "findings": list(memories.summaries),
+                "confidence": memories.mean_similarity()
             }
         else:
             print("ℹ️  No existing knowledge, need to research from scratch")
             return {
                 "topic": topic,
                 "findings": [],
-                "confidence": 0.0
+                "confidence": memories.mean_similarity()
             }
 
 
@@ -97,7 +98,7 @@ class PlanningAgent(Agent):
         # Generate plan (simplified)
         if memories:
             print(f"✅ Found {len(memories)} similar past experiences")
-            steps = [f"Step based on: {m.get('summary', '')[:40]}..." for m in memories[:3]]
+            steps = [f"Step based on: {summary[:40]}..." for summary in memories.summaries[:3]]
         else:
             print("ℹ️  No past experiences, creating new plan")
             steps = [f"Research {goal}", f"Execute {goal}", f"Validate {goal}"]
@@ -117,17 +118,26 @@ class ExecutionAgent(Agent):
     def __init__(self):
         super().__init__("Execution Agent", "Task Execution")
 
-    def execute(self, step: str) -> bool:
+    def find_known_issues(self, step: str) -> MemoryHits:
+        """Retrieve memories about known pitfalls for a step"""
+        return retrieve_memories(f"problems with {step}", limit=2)
+
+    def prefetch_known_issues(self, steps: List[str], pool: Executor) -> List[MemoryHits]:
+        """Look up known issues for all steps concurrently, before execution starts"""
+        return list(pool.map(self.find_known_issues, steps))
+
+    def execute(self, step: str, memories: Optional[MemoryHits] = None) -> bool:
         """Execute a step with memory guidance"""
         print(f"\n⚙️  Executing: {step}")
 
         # Check for known pitfalls
-        memories = retrieve_memories(f"problems with {step}", limit=2)
+        if memories is None:
+            memories = self.find_known_issues(step)
 
         if memories:
             print(f"⚠️  Found {len(memories)} known issues:")
-            for mem in memories:
-                print(f"   - {mem.get('summary', '')[:60]}...")
+            for summary in memories.summaries:
+                print(f"   - {summary[:60]}...")
 
         # Execute (simplified)
         success = True  # Replace with actual execution
@@ -156,20 +166,27 @@ def multi_agent_workflow(goal: str):
     planner = PlanningAgent()
     executor = ExecutionAgent()
 
-    # Step 1: Research
-    research_results = researcher.research(goal)
-    print(f"\n📊 Research confidence: {research_results['confidence']:.2f}")
+    # Retrievals are I/O-bound (Ollama HTTP + SQLite), so threads overlap them
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        # Step 1 + 2: Research and plan are independent, run them concurrently
+        research_future = pool.submit(researcher.research, goal)
+        plan_future = pool.submit(planner.plan, goal)
+
+        research_results = research_future.result()
+        print(f"\n📊 Research confidence: {research_results['confidence']:.2f}")
+
+        plan = plan_future.result()
+        print(f"\n📋 Generated plan:")
+        for i, step in enumerate(plan, 1):
+            print(f"   {i}. {step}")
 
-    # Step 2: Plan
-    plan = planner.plan(goal)
-    print(f"\n📋 Generated plan:")
-    for i, step in enumerate(plan, 1):
-        print(f"   {i}. {step}")
+        # Prefetch known issues for every step before executing
+        known_issues = executor.prefetch_known_issues(plan, pool)
 
     # Step 3: Execute
     print(f"\n⚙️  Executing plan...")
-    for step in plan:
-        success = executor.execute(step)
+    for step, memories in zip(plan, known_issues):
+        success = executor.execute(step, memories)
         if not success:
             print(f"❌ Failed at: {step}")
             break
@@ -14,6 +14,68 @@ from pathlib import Path
 MEMORY_DIR = Path.home() / ".my-memory"
 DB_PATH = MEMORY_DIR / "my-memories.db"
 
+# Vector index; cosine metric so KNN ranks by angle (vectors are unit length)
+VEC_MEMORIES_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS vec_memories
+    USING vec0(
+        embedding float[1024] distance_metric=cosine
+    )
+"""
+
+def move_embedding_json_to_cold_table(cursor):
+    """
+    Move the legacy memories.embedding_json column into embedding_json_store.
+
+    Older databases kept ~15KB of embedding JSON in every memories row, which
+    bloats scans over date/type/summary. The JSON is preserved in a side table
+    keyed by uuid and the column is dropped (or blanked on SQLite < 3.35).
+    """
+    cursor.execute("PRAGMA table_info(memories)")
+    if "embedding_json" not in [row[1] for row in cursor.fetchall()]:
+        return
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_json_store (
+            uuid TEXT PRIMARY KEY,
+            json TEXT NOT NULL,
+            FOREIGN KEY (uuid) REFERENCES memories(uuid)
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO embedding_json_store (uuid, json)
+        SELECT uuid, embedding_json FROM memories WHERE embedding_json IS NOT NULL
+    """)
+    try:
+        cursor.execute("ALTER TABLE memories DROP COLUMN embedding_json")
+    except sqlite3.OperationalError:
+        cursor.execute("UPDATE memories SET embedding_json = NULL")
+
+def rebuild_vec_table_for_cosine(cursor):
+    """
+    Recreate a legacy vec_memories table with distance_metric=cosine.
+
+    Older databases declared vec_memories with the default L2 metric and
+    stored unnormalized vectors; KNN queries (MATCH ... AND k = ?) rank by
+    the table's metric, so those tables are rebuilt with the same rowids
+    and unit-length vectors.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_memories'")
+    row = cursor.fetchone()
+    if row is None or "distance_metric=cosine" in "".join(row[0].split()).lower():
+        return
+
+    cursor.execute("""
+        CREATE TEMP TABLE vec_memories_legacy AS
+        SELECT rowid AS vec_rowid, embedding FROM vec_memories
+    """)
+    cursor.execute("DROP TABLE vec_memories")
+    cursor.execute(VEC_MEMORIES_DDL)
+    cursor.execute("""
+        INSERT INTO vec_memories (rowid, embedding)
+        SELECT vec_rowid, vec_normalize(embedding) FROM vec_memories_legacy
+    """)
+    cursor.execute("DROP TABLE vec_memories_legacy")
+
 def init_db():
     """Initialize SQLite database with sqlite-vec"""
     print(f"📊 Initializing database at {DB_PATH}")
@@ -27,6 +89,16 @@ def init_db():
     conn.enable_load_extension(False)
     cursor = conn.cursor()
 
+    # Page size only takes effect on a new database, before tables exist
+    cursor.execute("PRAGMA page_size=8192")
+
+    # WAL lets readers proceed while a write transaction is open
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+    cursor.execute("PRAGMA mmap_size=1073741824")  # read pages via mmap (1GB)
+
     # Create personal_info table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS personal_info (
@@ -51,24 +123,24 @@ def init_db():
             type TEXT NOT NULL,
             summary TEXT NOT NULL,
             importance REAL,
-            embedding_json TEXT,
             metadata TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
 
+    # Keep the hot memories table dense on databases created before the split
+    move_embedding_json_to_cold_table(cursor)
+
     # Create index on date for faster queries
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_memories_date ON memories(date)
     """)
 
+    # Upgrade an L2 vec_memories table from older versions before creating it
+    rebuild_vec_table_for_cosine(cursor)
+
     # Create virtual table for vector search
-    cursor.execute("""
-        CREATE VIRTUAL TABLE IF NOT EXISTS vec_memories
-        USING vec0(
-            embedding float[1024]
-        )
-    """)
+    cursor.execute(VEC_MEMORIES_DDL)
 
     # Create mapping table: vec_rowid (INTEGER) <-> memory_uuid (TEXT)
     cursor.execute("""
@@ -79,6 +151,14 @@ def init_db():
         )
     """)
 
+    # Embedding cache: hash(model + text) -> float32 bytes, avoids re-embedding
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            hash TEXT PRIMARY KEY,
+            embedding BLOB NOT NULL
+        )
+    """)
+
     conn.commit()
 
     # Print stats
@@ -88,7 +168,7 @@ def init_db():
     conn.close()
 
     print(f"✅ Database initialized successfully")
-    print(f"   Tables: personal_info, memories, vec_memories, vec_memory_mapping")
+    print(f"   Tables: personal_info, memories, vec_memories, vec_memory_mapping, embedding_cache")
     print(f"   Current memories: {count}")
 
     return DB_PATH
@@ -5,37 +5,67 @@ Claude CLI Stream-JSON 输出格式化工具
 提供统一的 stream-json 解析和格式化显示功能
 """
 import json
-from typing import Optional, Tuple, List
+import queue
+import re
+import threading
+from typing import Callable, Dict, Optional, Tuple, List, Union
 from rich.console import Console
 from rich.markdown import Markdown
 
+# 优先使用 orjson（C/Rust 实现，解析更快），未安装时回退到标准库 json
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 # 使用 force_terminal 确保 rich 总是输出格式化内容
 console = Console(force_terminal=True)
 
+# 从 tool_use_id 提取工具名称：第一个 "_" 之后、下一个 "_" 或 "d" 之前的部分
+_TOOL_ID_RE = re.compile(r"^[^_]*_([^_d]*)")
+
+
+def _filename(path: str) -> str:
+    return path.split("/")[-1] if "/" in path else path
+
 
-def format_stream_line(line: str) -> Optional[str]:
+# 工具调用的格式化函数（按工具名查表，避免逐个比较）
+_TOOL_FORMATTERS: Dict[str, Callable[[dict], str]] = {
+    "TodoWrite": lambda i: f"[TOOL] TodoWrite 更新 {len(i.get('todos', []))} 个任务",
+    "Glob": lambda i: f"[TOOL] Glob 搜索: {i.get('pattern', '')}",
+    "Read": lambda i: f"[TOOL] Read 读取: {_filename(i.get('file_path', ''))}",
+    "Bash": lambda i: f"[TOOL] Bash 执行: {i.get('command', '')}",
+    "Skill": lambda i: f"[TOOL] Skill 调用: {i.get('skill', '')} {i.get('args', '')}",
+    "Grep": lambda i: f"[TOOL] Grep 搜索: {i.get('pattern', '')}",
+    "Write": lambda i: f"[TOOL] Write 写入: {_filename(i.get('file_path', ''))}",
+}
+
+
+def classify_stream_line(line: Union[str, bytes]) -> Optional[Tuple[str, str]]:
     """
-    格式化 stream-json 输出为人类可读格式
+    解析 stream-json 输出行，得到待显示的内容（不做任何输出）
 
     Args:
-        line: JSON 字符串
+        line: JSON 字符串（str 或 bytes，均可直接交给 JSON 解析器）
 
     Returns:
-        格式化后的字符串，如果不应该显示则返回 None
+        (kind, payload)，kind 为 "line"（普通文本）或 "assistant_md"
+        （需要用 rich 渲染的 markdown）；如果不应该显示则返回 None
     """
     try:
-        data = json.loads(line)
+        data = json_loads(line)
         msg_type = data.get("type", "unknown")
         subtype = data.get("subtype", "")
 
         # 根据 type 格式化输出
         if msg_type == "system":
             if subtype == "init":
-                return f"[SYSTEM] 初始化 Claude (模型: {data.get('model', 'N/A')})"
+                return ("line", f"[SYSTEM] 初始化 Claude (模型: {data.get('model', 'N/A')})")
             elif subtype in ["hook_started", "hook_response"]:
                 return None  # 不显示 hook 信息
             else:
-                return f"[SYSTEM] {subtype}"
+                return ("line", f"[SYSTEM] {subtype}")
 
         elif msg_type == "assistant":
             # 提取 assistant 的文本内容
@@ -51,41 +81,14 @@ def format_stream_line(line: str) -> Optional[str]:
                     tool_input = block.get("input", {})
 
                     # 格式化工具调用详情
-                    if tool_name == "TodoWrite":
-                        todos = tool_input.get("todos", [])
-                        return f"[TOOL] TodoWrite 更新 {len(todos)} 个任务"
-                    elif tool_name == "Glob":
-                        pattern = tool_input.get("pattern", "")
-                        return f"[TOOL] Glob 搜索: {pattern}"
-                    elif tool_name == "Read":
-                        path = tool_input.get("file_path", "")
-                        filename = path.split("/")[-1] if "/" in path else path
-                        return f"[TOOL] Read 读取: {filename}"
-                    elif tool_name == "Bash":
-                        command = tool_input.get("command", "")
-                        return f"[TOOL] Bash 执行: {command}"
-                    elif tool_name == "Skill":
-                        skill = tool_input.get("skill", "")
-                        args = tool_input.get("args", "")
-                        return f"[TOOL] Skill 调用: {skill} {args}"
-                    elif tool_name == "Grep":
-                        pattern = tool_input.get("pattern", "")
-                        return f"[TOOL] Grep 搜索: {pattern}"
-                    elif tool_name == "Write":
-                        path = tool_input.get("file_path", "")
-                        filename = path.split("/")[-1] if "/" in path else path
-                        return f"[TOOL] Write 写入: {filename}"
-                    else:
-                        return f"[TOOL] 调用 {tool_name}"
+                    formatter = _TOOL_FORMATTERS.get(tool_name)
+                    if formatter:
+                        return ("line", formatter(tool_input))
+                    return ("line", f"[TOOL] 调用 {tool_name}")
 
             if text_parts:
-                # 完整显示 ASSISTANT 的消息
-                text = ''.join(text_parts).strip()
-                # 打印前缀
-                print("[ASSISTANT]", flush=True)
-                # 使用 rich 渲染 markdown
-                console.print(Markdown(text))
-                return None  # 已经直接打印了，返回 None
+                # 完整显示 ASSISTANT 的消息（markdown 交给渲染端处理）
+                return ("assistant_md", ''.join(text_parts).strip())
 
         elif msg_type == "user":
             # 提取 user 的工具结果
@@ -97,33 +100,65 @@ def format_stream_line(line: str) -> Optional[str]:
                         tool_use_id = first_result.get("tool_use_id", "")
                         # 从 tool_use_id 提取工具名称
                         if "call_" in tool_use_id:
-                            tool_name = tool_use_id.split("_")[1].split("d")[0] if "d" in tool_use_id else "unknown"
+                            tool_name = _TOOL_ID_RE.match(tool_use_id).group(1) if "d" in tool_use_id else "unknown"
                             content = first_result.get("content", "")
 
                             # 显示结果摘要
                             if isinstance(content, str) and len(content) > 0:
                                 # 完整显示，不截断（用户需要看到完整输出）
-                                return f"[RESULT] {tool_name}:\n{content}"
+                                return ("line", f"[RESULT] {tool_name}:\n{content}")
                             elif isinstance(content, dict) and "filenames" in content:
                                 num_files = len(content.get("filenames", []))
-                                return f"[RESULT] {tool_name}: 找到 {num_files} 个文件"
+                                return ("line", f"[RESULT] {tool_name}: 找到 {num_files} 个文件")
                             else:
-                                return f"[RESULT] {tool_name}: ✓"
-                        return f"[RESULT] {tool_use_id}"
+                                return ("line", f"[RESULT] {tool_name}: ✓")
+                        return ("line", f"[RESULT] {tool_use_id}")
             return None
 
         elif msg_type == "result":
-            return f"\n{'='*60}\n[RESULT] ✓ 生成完成\n{'='*60}\n"
+            return ("line", f"\n{'='*60}\n[RESULT] ✓ 生成完成\n{'='*60}\n")
 
         return None  # 默认不显示
 
-    except json.JSONDecodeError:
+    except ValueError:  # json / orjson 的 JSONDecodeError 都是 ValueError 子类
         return None
     except Exception:
         return None
 
 
-def parse_stream_result(output_lines: List[str]) -> Optional[str]:
+def render_stream_item(kind: str, payload: str) -> None:
+    """显示 classify_stream_line 的结果"""
+    if kind == "assistant_md":
+        # 打印前缀
+        print("[ASSISTANT]", flush=True)
+        # 使用 rich 渲染 markdown
+        console.print(Markdown(payload))
+    else:
+        print(payload, flush=True)
+
+
+def format_stream_line(line: Union[str, bytes]) -> Optional[str]:
+    """
+    格式化 stream-json 输出为人类可读格式
+
+    Args:
+        line: JSON 字符串（str 或 bytes，均可直接交给 JSON 解析器）
+
+    Returns:
+        格式化后的字符串，如果不应该显示则返回 None
+        （ASSISTANT 消息会直接渲染输出，同样返回 None）
+    """
+    item = classify_stream_line(line)
+    if item is None:
+        return None
+    kind, payload = item
+    if kind == "assistant_md":
+        render_stream_item(kind, payload)
+        return None
+    return payload
+
+
+def parse_stream_result(output_lines: List[Union[str, bytes]]) -> Optional[str]:
     """
     从 stream-json 输出中提取最终结果
 
@@ -133,18 +168,42 @@ def parse_stream_result(output_lines: List[str]) -> Optional[str]:
     Returns:
         最终结果文本，如果找不到则返回 None
     """
-    for line in output_lines:
+    # result 记录总在流的末尾，倒序扫描通常只需解析 1~3 行；
+    # 不含 "result" 子串的行直接跳过，不做 JSON 解析
+    for line in reversed(output_lines):
+        marker = b'"result"' if isinstance(line, bytes) else '"result"'
+        if marker not in line:
+            continue
         try:
-            data = json.loads(line)
+            data = json_loads(line)
             # 提取 type="result" 的最终结果
             if data.get("type") == "result":
                 return data.get("result", "")
-        except json.JSONDecodeError:
+        except ValueError:
             continue
 
     return None
 
 
+def _decode_output(chunks: List[Union[str, bytes]]) -> str:
+    """拼接输出块；bytes 只在最后统一解码一次"""
+    if chunks and isinstance(chunks[0], bytes):
+        return b"".join(chunks).decode("utf-8", errors="replace")
+    return "".join(chunks)
+
+
+def _render_worker(render_queue: "queue.Queue") -> None:
+    """渲染线程：依次显示队列中的 (kind, payload)，收到 None 时退出"""
+    while True:
+        item = render_queue.get()
+        if item is None:
+            break
+        try:
+            render_stream_item(*item)
+        except Exception:
+            pass  # 显示失败不影响结果收集
+
+
 def stream_claude_output(process) -> Tuple[bool, str]:
     """
     实时显示 Claude CLI 的格式化输出，并捕获最终结果
@@ -158,23 +217,37 @@ def stream_claude_output(process) -> Tuple[bool, str]:
         output - 如果成功，返回原始输出（不含 JSON），否则返回错误信息
     """
     output_lines = []
-    text_output_lines = []  # 收集非 JSON 的文本输出
 
-    try:
-        for line in process.stdout:
-            output_lines.append(line)
-            text_output_lines.append(line)
+    # 渲染（尤其是 rich markdown）放到单独线程，读取循环只做解析和分类，
+    # 避免渲染阻塞 stdout 管道的读取
+    render_queue = queue.Queue(maxsize=64)
+    renderer = threading.Thread(target=_render_worker, args=(render_queue,), daemon=True)
+    renderer.start()
 
-            # 格式化显示
-            formatted = format_stream_line(line)
-            if formatted:
-                print(formatted, flush=True)
+    try:
+        try:
+            # 以 bytes 逐行读取：省去逐块 UTF-8 解码和换行转换，
+            # JSON 解析器可以直接处理 bytes
+            while True:
+                line = process.stdout.readline()
+                if not line:
+                    break
+                output_lines.append(line)
+
+                # 格式化显示
+                item = classify_stream_line(line)
+                if item:
+                    render_queue.put(item)
+        finally:
+            # 通知渲染线程结束，并等待已排队的内容显示完
+            render_queue.put(None)
+            renderer.join()
 
         # 等待进程结束
         returncode = process.wait()
 
         if returncode != 0:
-            stderr_out = process.stderr.read()
+            stderr_out = _decode_output([process.stderr.read()])
             return False, stderr_out
 
         # 提取最终结果
@@ -184,8 +257,8 @@ def stream_claude_output(process) -> Tuple[bool, str]:
         if final_result:
             return True, final_result
 
-        # 否则返回所有非 JSON 的文本输出
-        return True, ''.join(text_output_lines)
+        # 否则（没有 result 记录时）才拼接全部原始输出
+        return True, _decode_output(output_lines)
 
     except Exception as e:
         return False, str(e)
@@ -208,8 +281,7 @@ def run_claude_stream(cmd, env=None):
         cmd,
         env=env,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
+        stderr=subprocess.PIPE
     )
 
     return stream_claude_output(process)
@@ -9,13 +9,32 @@ try:
     from pysqlite3 import dbapi2 as sqlite3
 except ImportError:
     import sqlite3
+import hashlib
+import http.client
 import json
+import mmap
+import re
 import subprocess
 import uuid
 from pathlib import Path
 from datetime import datetime
+import numpy as np
 import sqlite_vec
 
+# Prefer orjson (C parser/encoder) for embedding payloads and metadata
+try:
+    import orjson
+
+    def json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    json_loads = json.loads
+
 # Add script dir to sys.path to import claude_stream
 script_dir = Path(__file__).parent.resolve()
 sys.path.append(str(script_dir))
@@ -30,8 +49,32 @@ except ImportError as e:
 # Configuration
 MEMORY_DIR = Path.home() / ".my-memory"
 DB_PATH = MEMORY_DIR / "my-memories.db"
+OLLAMA_HOST = "localhost"
+OLLAMA_PORT = 11434
 OLLAMA_MODEL = "bge-m3"
 EMBEDDING_DIM = 1024  # bge-m3 uses 1024 dimensions
+MAX_ENTRY_CHARS = 2000  # per-entry cap in the summarization prompt
+
+# Markdown code fence markers around Claude's JSON output
+_FENCE_RE = re.compile(r'```(?:json)?\n?')
+_JSON_DECODER = json.JSONDecoder()
+
+# Entry type keyword in a header ("## HH:MM - <type> ...")
+_TYPE_RE = re.compile(r'task|knowledge|noise|note', re.IGNORECASE)
+
+# Keep-alive HTTP connection to Ollama, opened on first request
+_ollama_conn = None
+
+# In-process embedding cache: embedding_cache_key(text) -> float32 vector
+_EMB_CACHE = {}
+
+# Vector index; cosine metric so KNN ranks by angle (vectors are unit length)
+VEC_MEMORIES_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS vec_memories
+    USING vec0(
+        embedding float[1024] distance_metric=cosine
+    )
+"""
 
 def get_memory_file(date_str):
     """Get memory file path for given date (YYYY-MM-DD format)"""
@@ -51,59 +94,96 @@ def get_memory_file(date_str):
 
 def read_memory_entries(memory_file):
     """Read and parse memory entries from file"""
-    content = memory_file.read_text(encoding='utf-8')
     entries = []
 
-    current_entry = []
-    current_time = None
-    current_type = None
-
-    for line in content.splitlines():
-        if line.startswith("## ") and " - " in line:
-            # Save previous entry
-            if current_entry:
-                entries.append({
-                    "time": current_time,
-                    "type": current_type,
-                    "content": "\n".join(current_entry).strip()
-                })
-
-            # Parse new entry
-            parts = line[3:].split(" - ")
-            current_time = parts[0].strip()
-            rest = parts[1] if len(parts) > 1 else ""
-
-            # Extract type (task, knowledge, noise, note)
-            for t in ["task", "knowledge", "noise", "note"]:
-                if t in rest.lower():
-                    current_type = t
-                    break
-            else:
-                current_type = "note"
-
-            current_entry = []
-        else:
-            current_entry.append(line)
+    with open(memory_file, 'rb') as f:
+        if memory_file.stat().st_size == 0:
+            return entries
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # Entry bodies are tracked as byte offsets into the map and decoded
+            # once per entry, rather than collected and re-joined line by line
+            body_start = 0
+            current_time = None
+            current_type = None
+
+            def add_entry(end):
+                if end > body_start:
+                    entries.append({
+                        "time": current_time,
+                        "type": current_type,
+                        "content": mm[body_start:end].decode('utf-8').strip()
+                    })
 
-    # Save last entry
-    if current_entry:
-        entries.append({
-            "time": current_time,
-            "type": current_type,
-            "content": "\n".join(current_entry).strip()
-        })
+            line_start = 0
+            for line in iter(mm.readline, b''):
+                line_end = line_start + len(line)
+
+                if line.startswith(b"## ") and b" - " in line:
+                    # Save previous entry
+                    add_entry(line_start)
+
+                    # Parse new entry
+                    parts = line[3:].decode('utf-8').rstrip("\r\n").split(" - ")
+                    current_time = parts[0].strip()
+                    rest = parts[1] if len(parts) > 1 else ""
+
+                    # Extract type (task, knowledge, noise, note)
+                    type_match = _TYPE_RE.search(rest)
+                    current_type = type_match.group(0).lower() if type_match else "note"
+
+                    body_start = line_end
+
+                line_start = line_end
+
+            # Save last entry
+            add_entry(line_start)
+        finally:
+            mm.close()
 
     return entries
 
+def extract_json_array(text):
+    """
+    Return the first JSON array of objects embedded in text, or None.
+
+    Arrays of other values (e.g. "[1]" in Claude's prose) are skipped; an
+    empty array is returned only if no non-empty array of objects follows.
+    """
+    empty = None
+    start = text.find("[")
+    while start >= 0:
+        try:
+            # raw_decode parses one value from start and ignores trailing text
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(obj, list) and all(isinstance(item, dict) for item in obj):
+                if obj:
+                    return obj
+                if empty is None:
+                    empty = obj
+        except json.JSONDecodeError:
+            pass
+        start = text.find("[", start + 1)
+    return empty
+
 def summarize_with_claude(entries):
     """Use Claude to summarize and extract long-term memories"""
     print("🤖 Calling Claude to summarize...")
 
+    # Drop entries already tagged as noise and cap entry length before
+    # building the prompt; prompt size drives Claude's latency and cost
+    entries = [e for e in entries if e['type'] != 'noise']
+    if not entries:
+        print("ℹ️  Only noise entries, nothing to summarize")
+        return []
+
     # Build prompt
     entries_text = "\n\n".join([
-        f"[{e['type']}] {e['content']}"
+        f"[{e['type']}] {e['content'][:MAX_ENTRY_CHARS]}"
         for e in entries
     ])
+    print(f"   Prompt entries: {len(entries)} ({len(entries_text)} chars)")
 
     prompt = f"""
 You are a Memory Summarization Agent.
@@ -191,24 +271,12 @@ Remember: Quality over quantity. 3-8 high-quality memories is better than 20 tri
             output = result.stdout
 
         # Extract JSON from output (handle markdown code blocks)
-        # Try to find JSON array
-        json_start = output.find("[")
-        json_end = output.rfind("]") + 1
-
-        if json_start >= 0 and json_end > json_start:
-            json_str = output[json_start:json_end]
-            try:
-                return json.loads(json_str)
-            except:
-                # Try removing markdown code blocks
-                import re
-                # Remove ```json and ``` markers
-                json_clean = re.sub(r'```(?:json)?\n?', '', output)
-                json_start = json_clean.find("[")
-                json_end = json_clean.rfind("]") + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = json_clean[json_start:json_end]
-                    return json.loads(json_str)
+        summaries = extract_json_array(output)
+        if summaries is None:
+            # Remove ```json and ``` markers and try again
+            summaries = extract_json_array(_FENCE_RE.sub('', output))
+        if summaries is not None:
+            return summaries
 
         print("⚠️  No JSON found in Claude output")
         print("Raw output (first 500 chars):")
@@ -222,29 +290,153 @@ Remember: Quality over quantity. 3-8 high-quality memories is better than 20 tri
         print(f"❌ Error calling Claude: {e}")
         return []
 
-def get_embedding(text):
-    """Get embedding from Ollama (using HTTP API)"""
-    try:
-        import urllib.request
-        import json
+def embedding_cache_key(text):
+    """Cache key for an embedding: hash of model name + normalized text"""
+    normalized = f"{OLLAMA_MODEL}\0{text.strip()}"
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+def ollama_post(path, payload):
+    """POST JSON to Ollama over a reused keep-alive connection"""
+    global _ollama_conn
+    body = json_dumps(payload)
+
+    # Retry once on a fresh socket if the kept-alive one was closed by the server
+    for attempt in range(2):
+        if _ollama_conn is None:
+            _ollama_conn = http.client.HTTPConnection(OLLAMA_HOST, OLLAMA_PORT, timeout=30)
+        try:
+            _ollama_conn.request("POST", path, body=body, headers={'Content-Type': 'application/json'})
+            response = _ollama_conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, ConnectionError):
+            _ollama_conn.close()
+            _ollama_conn = None
+            if attempt:
+                raise
+            continue
+
+        if response.status != 200:
+            raise RuntimeError(f"Ollama returned HTTP {response.status}: {data[:200]!r}")
+        return json_loads(data)
+
+def request_embeddings(texts):
+    """
+    POST texts to Ollama's batched /api/embed endpoint (raises on failure).
+
+    Returns a (len(texts), EMBEDDING_DIM) float32 array.
+    """
+    result = ollama_post("/api/embed", {
+        "model": OLLAMA_MODEL,
+        "input": texts
+    })
+    embeddings = np.asarray(result.get("embeddings", []), dtype=np.float32)
+
+    if embeddings.shape != (len(texts), EMBEDDING_DIM):
+        raise ValueError(f"expected {len(texts)} embeddings of dim {EMBEDDING_DIM}, got shape {embeddings.shape}")
+
+    return embeddings
+
+def get_embeddings_batch(texts, conn=None):
+    """
+    Get embeddings for several texts with a single Ollama request.
+
+    Texts seen before are served from the in-process cache, then from the
+    embedding_cache table when a connection is given; only misses are sent
+    to Ollama, and new embeddings are written back to both caches.
+    Returns one float32 vector per text, or None where embedding failed.
+    """
+    keys = [embedding_cache_key(text) for text in texts]
+    missing = [key for key in dict.fromkeys(keys) if key not in _EMB_CACHE]
+
+    if conn is not None and missing:
+        placeholders = ",".join("?" * len(missing))
+        rows = conn.execute(
+            f"SELECT hash, embedding FROM embedding_cache WHERE hash IN ({placeholders})",
+            missing
+        ).fetchall()
+        for key, blob in rows:
+            _EMB_CACHE[key] = np.frombuffer(blob, dtype=np.float32)
+        missing = [key for key in missing if key not in _EMB_CACHE]
+
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        try:
+            embeddings = request_embeddings([text_by_key[key].strip() for key in missing])
+        except Exception as e:
+            print(f"⚠️  Warning: Could not get embeddings: {e}")
+            embeddings = []
+
+        new_rows = []
+        for key, embedding in zip(missing, embeddings):
+            _EMB_CACHE[key] = embedding
+            new_rows.append((key, embedding.tobytes()))
+
+        if conn is not None and new_rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (hash, embedding) VALUES (?, ?)",
+                new_rows
+            )
+            conn.commit()
 
-        url = "http://localhost:11434/api/embeddings"
-        data = json.dumps({
-            "model": OLLAMA_MODEL,
-            "prompt": text
-        }).encode('utf-8')
+    return [_EMB_CACHE.get(key) for key in keys]
 
-        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+def get_embedding(text):
+    """Get embedding for a single text from Ollama (None on failure)"""
+    return get_embeddings_batch([text])[0]
 
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            embedding = result.get("embedding", [])
+def move_embedding_json_to_cold_table(cursor):
+    """
+    Move the legacy memories.embedding_json column into embedding_json_store.
 
-        return embedding
+    Older databases kept ~15KB of embedding JSON in every memories row, which
+    bloats scans over date/type/summary. The JSON is preserved in a side table
+    keyed by uuid and the column is dropped (or blanked on SQLite < 3.35).
+    """
+    cursor.execute("PRAGMA table_info(memories)")
+    if "embedding_json" not in [row[1] for row in cursor.fetchall()]:
+        return
 
-    except Exception as e:
-        print(f"⚠️  Warning: Could not get embedding: {e}")
-        return []
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_json_store (
+            uuid TEXT PRIMARY KEY,
+            json TEXT NOT NULL,
+            FOREIGN KEY (uuid) REFERENCES memories(uuid)
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO embedding_json_store (uuid, json)
+        SELECT uuid, embedding_json FROM memories WHERE embedding_json IS NOT NULL
+    """)
+    try:
+        cursor.execute("ALTER TABLE memories DROP COLUMN embedding_json")
+    except sqlite3.OperationalError:
+        cursor.execute("UPDATE memories SET embedding_json = NULL")
+
+def rebuild_vec_table_for_cosine(cursor):
+    """
+    Recreate a legacy vec_memories table with distance_metric=cosine.
+
+    Older databases declared vec_memories with the default L2 metric and
+    stored unnormalized vectors; KNN queries (MATCH ... AND k = ?) rank by
+    the table's metric, so those tables are rebuilt with the same rowids
+    and unit-length vectors.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_memories'")
+    row = cursor.fetchone()
+    if row is None or "distance_metric=cosine" in "".join(row[0].split()).lower():
+        return
+
+    cursor.execute("""
+        CREATE TEMP TABLE vec_memories_legacy AS
+        SELECT rowid AS vec_rowid, embedding FROM vec_memories
+    """)
+    cursor.execute("DROP TABLE vec_memories")
+    cursor.execute(VEC_MEMORIES_DDL)
+    cursor.execute("""
+        INSERT INTO vec_memories (rowid, embedding)
+        SELECT vec_rowid, vec_normalize(embedding) FROM vec_memories_legacy
+    """)
+    cursor.execute("DROP TABLE vec_memories_legacy")
 
 def init_db():
     """Initialize SQLite database with sqlite-vec"""
@@ -254,6 +446,16 @@ def init_db():
     conn.enable_load_extension(False)
     cursor = conn.cursor()
 
+    # Page size only takes effect on a new database, before tables exist
+    cursor.execute("PRAGMA page_size=8192")
+
+    # WAL lets readers proceed while a write transaction is open
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+    cursor.execute("PRAGMA mmap_size=1073741824")  # read pages via mmap (1GB)
+
     # Create personal_info table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS personal_info (
@@ -278,19 +480,19 @@ def init_db():
             type TEXT NOT NULL,
             summary TEXT NOT NULL,
             importance REAL,
-            embedding_json TEXT,
             metadata TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
 
+    # Keep the hot memories table dense on databases created before the split
+    move_embedding_json_to_cold_table(cursor)
+
+    # Upgrade an L2 vec_memories table from older versions before creating it
+    rebuild_vec_table_for_cosine(cursor)
+
     # Create virtual table for vector search with integer rowid + uuid reference
-    cursor.execute("""
-        CREATE VIRTUAL TABLE IF NOT EXISTS vec_memories
-        USING vec0(
-            embedding float[1024]
-        )
-    """)
+    cursor.execute(VEC_MEMORIES_DDL)
 
     # Create a mapping table: vec_rowid (INTEGER) <-> memory_uuid (TEXT)
     # This allows sqlite-vec to use integer rowids while we keep UUID for merges
@@ -302,6 +504,14 @@ def init_db():
         )
     """)
 
+    # Embedding cache: hash(model + text) -> float32 bytes, avoids re-embedding
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            hash TEXT PRIMARY KEY,
+            embedding BLOB NOT NULL
+        )
+    """)
+
     conn.commit()
     return conn
 
@@ -309,7 +519,32 @@ def save_memories(conn, date_str, summaries):
     """Save summarized memories to database"""
     cursor = conn.cursor()
 
-    for item in summaries:
+    # Embed all summaries in one request instead of one round-trip per item
+    embeddings = get_embeddings_batch([item.get("summary", "") for item in summaries], conn)
+
+    # Store unit-length vectors so cosine similarity is a plain dot product,
+    # normalizing every embedded summary in one array operation
+    embedded = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+    vector_by_index = {}
+    if embedded:
+        vectors = np.stack([embeddings[i] for i in embedded])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        vector_by_index = dict(zip(embedded, vectors))
+
+    # One write transaction (and one fsync) for all inserts
+    cursor.execute("BEGIN IMMEDIATE")
+
+    memory_rows = []
+    vec_rows = []
+    mapping_rows = []
+
+    # Assign vec_memories rowids up front so the mapping rows can be built
+    # without reading lastrowid after every insert (safe under the write lock)
+    cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM vec_memories")
+    next_vec_rowid = cursor.fetchone()[0] + 1
+
+    for i, item in enumerate(summaries):
         summary = item.get("summary", "")
         mem_type = item.get("type", "note")
         importance = item.get("importance", 0.5)
@@ -318,47 +553,42 @@ def save_memories(conn, date_str, summaries):
         # Generate UUID as primary key (for multi-device merge)
         memory_uuid = str(uuid.uuid4())
 
-        # Get embedding
-        embedding = get_embedding(summary)
-        embedding_json = json.dumps(embedding) if embedding else None
-
         # Metadata (store tags here for future filtering)
-        metadata = json.dumps({
+        metadata = json_dumps({
             "original_time": item.get("original_time"),
             "original_type": item.get("original_type"),
             "tags": tags
-        })
-
-        # Insert into memories table (UUID is primary key)
-        cursor.execute("""
-            INSERT INTO memories (uuid, date, type, summary, importance, embedding_json, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (memory_uuid, date_str, mem_type, summary, importance, embedding_json, metadata))
-
-        # Insert into vec_memories for efficient vector search
-        if embedding:
-            try:
-                # Convert embedding list to float32 numpy array for sqlite-vec
-                import numpy as np
-                embedding_array = np.array(embedding, dtype=np.float32)
-
-                # Insert into vec_memories (auto-increments rowid)
-                cursor.execute("""
-                    INSERT INTO vec_memories (embedding)
-                    VALUES (?)
-                """, (embedding_array,))
-
-                # Get the auto-increment vec_rowid
-                vec_rowid = cursor.lastrowid
-
-                # Map vec_rowid to memory_uuid
-                cursor.execute("""
-                    INSERT INTO vec_memory_mapping (vec_rowid, memory_uuid)
-                    VALUES (?, ?)
-                """, (vec_rowid, memory_uuid))
-
-            except Exception as e:
-                print(f"⚠️  Warning: Could not insert into vec_memories: {e}")
+        }).decode('utf-8')
+
+        memory_rows.append((memory_uuid, date_str, mem_type, summary, importance, metadata))
+
+        # Embeddings are stored only in vec_memories (packed float32)
+        if i in vector_by_index:
+            vec_rows.append((next_vec_rowid, vector_by_index[i].tobytes()))
+            mapping_rows.append((next_vec_rowid, memory_uuid))
+            next_vec_rowid += 1
+
+    # Insert into memories table (UUID is primary key)
+    cursor.executemany("""
+        INSERT INTO memories (uuid, date, type, summary, importance, metadata)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, memory_rows)
+
+    if vec_rows:
+        try:
+            # Insert into vec_memories, then map vec_rowid to memory_uuid
+            cursor.executemany("""
+                INSERT INTO vec_memories (rowid, embedding)
+                VALUES (?, ?)
+            """, vec_rows)
+
+            cursor.executemany("""
+                INSERT INTO vec_memory_mapping (vec_rowid, memory_uuid)
+                VALUES (?, ?)
+            """, mapping_rows)
+
+        except Exception as e:
+            print(f"⚠️  Warning: Could not insert into vec_memories: {e}")
 
     conn.commit()
     print(f"✅ Saved {len(summaries)} memories to database")
@@ -392,7 +622,7 @@ def main():
 
     print(f"\n✨ Extracted {len(summaries)} long-term memories:")
     for s in summaries:
-        print(f"   - [{s['type']}] {s['summary']}")
+        print(f"   - [{s.get('type', 'note')}] {s.get('summary', '')}")
 
     # Step 3: Save to database
     conn = init_db()
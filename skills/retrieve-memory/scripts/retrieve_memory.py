@@ -2,97 +2,417 @@
 """
 Retrieve memories from database using semantic search + keyword search.
 Usage: python3 retrieve_memory.py --query "your search query"
+
+Can also be imported as a library: search(query, limit) returns the merged
+results as a list of dicts without spawning a new process.
 """
 import sys
 import argparse
+import atexit
 try:
     from pysqlite3 import dbapi2 as sqlite3
 except ImportError:
     import sqlite3
+import hashlib
+import heapq
+import http.client
 import json
+import os
+import re
 import subprocess
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
 import numpy as np
 import sqlite_vec
 
+# Prefer orjson (C parser/encoder) for embedding payloads and metadata
+try:
+    import orjson
+
+    def json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    json_loads = json.loads
+
 # Configuration
 MEMORY_DIR = Path.home() / ".my-memory"
 DB_PATH = MEMORY_DIR / "my-memories.db"
+OLLAMA_HOST = "localhost"
+OLLAMA_PORT = 11434
 OLLAMA_MODEL = "bge-m3"
 EMBEDDING_DIM = 1024
+RRF_K = 60  # Reciprocal Rank Fusion damping constant
+BM25_K1 = 1.5  # term frequency saturation
+BM25_B = 0.75  # document length normalization
+
+# Keyword tokens: runs of CJK characters, or runs of other word characters
+_TOKEN_RE = re.compile(r"[\u3400-\u9fff]+|[^\W\u3400-\u9fff]+")
+_CJK_RE = re.compile(r"[\u3400-\u9fff]")
+
+# Entry header line in a daily memory file: "## HH:MM - title"
+_ENTRY_RE = re.compile(r"^##(?= )(?=.*? - ).*$", re.MULTILINE)
+
+# Per-day keyword index written next to each daily file; bump the version
+# whenever the tokenizer or the stored layout changes
+KEYWORD_INDEX_SUFFIX = ".idx.json"
+KEYWORD_INDEX_VERSION = 1
+
+# Shared connection, opened lazily on first use (sqlite-vec loaded once).
+# search() may be called from several threads, so access goes through _db_lock.
+_conn = None
+_db_lock = threading.Lock()
+_semantic_search_sql = None  # phase-1 SQL for the open database, set by get_connection()
+
+# Keep-alive HTTP connection to Ollama, one per thread (opened on first request)
+_ollama_local = threading.local()
+
+# Filtered semantic search over-fetches KNN candidates so that enough survive
+# the date/type filter; sqlite-vec rejects k above 4096
+SEMANTIC_OVERSAMPLE = 5
+SEMANTIC_MAX_K = 4096
+
+# Bound variables per statement on SQLite < 3.32 (the stdlib sqlite3 fallback
+# may link one); longer IN (...) lists are split into chunks
+SQL_MAX_VARIABLES = 999
+
+# Semantic cache for search(): near-duplicate queries reuse earlier results.
+# Entries expire after the TTL so newly written memories show up.
+SEMANTIC_CACHE_SIZE = 128
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_TTL = 300  # seconds
+
+
+class SemanticCache:
+    """
+    Fixed-size LRU cache keyed by query embedding.
+
+    Embeddings are L2-normalized and kept in one (size, dim) float32 matrix,
+    so a lookup is a single matrix-vector product against all entries.
+    """
+
+    def __init__(self, size=SEMANTIC_CACHE_SIZE, dim=EMBEDDING_DIM,
+                 threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.vectors = np.zeros((size, dim), dtype=np.float32)
+        self.entries = [None] * size  # (params, results) per slot
+        self.last_used = np.zeros(size, dtype=np.int64)  # 0 = empty slot
+        self.stored_at = np.zeros(size, dtype=np.float64)  # time.monotonic() of put
+        self.clock = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, params):
+        """Return cached results for a similar query with the same params, or None"""
+        query = self._normalize(embedding)
+        with self.lock:
+            # Only live entries cached with the same params are candidates
+            candidates = (self.last_used != 0) & (self.stored_at > time.monotonic() - self.ttl)
+            candidates &= np.array([entry is not None and entry[0] == params for entry in self.entries])
+            if not candidates.any():
+                return None
+            similarities = self.vectors @ query
+            similarities[~candidates] = -1.0
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                return None
+            self.clock += 1
+            self.last_used[slot] = self.clock
+            return list(self.entries[slot][1])
+
+    def put(self, embedding, params, results):
+        """Store results, evicting the least recently used entry when full"""
+        query = self._normalize(embedding)
+        with self.lock:
+            slot = int(np.argmin(self.last_used))
+            self.clock += 1
+            self.vectors[slot] = query
+            self.entries[slot] = (params, list(results))
+            self.last_used[slot] = self.clock
+            self.stored_at[slot] = time.monotonic()
+
+    def clear(self):
+        """Drop every entry (e.g. after new memories were written)"""
+        with self.lock:
+            self.entries = [None] * len(self.entries)
+            self.last_used[:] = 0
+            self.stored_at[:] = 0.0
+
+
+_semantic_cache = SemanticCache()
+
+# Background workers for the keyword scan that runs alongside query embedding
+_background_pool = ThreadPoolExecutor(max_workers=4)
+
+# SQL kept as module constants so the connection's statement cache reuses
+# the prepared statements across calls.
+#
+# Phase 1: rank candidates by vector distance, fetching only ids. The KNN
+# query is pushed into the vec0 table (MATCH + k) so sqlite-vec picks the
+# nearest rows itself, then joins through vec_memory_mapping to link
+# vec_rowid <-> memory_uuid for just those k rows
+SEMANTIC_SEARCH_SQL = """
+    SELECT
+        map.memory_uuid,
+        v.distance
+    FROM (
+        SELECT rowid, distance
+        FROM vec_memories
+        WHERE embedding MATCH ? AND k = ?
+        ORDER BY distance
+    ) v
+    JOIN vec_memory_mapping map ON v.rowid = map.vec_rowid
+    ORDER BY v.distance ASC
+"""
 
-def get_embedding(text):
-    """Get embedding from Ollama (using HTTP API)"""
-    try:
-        import urllib.request
-        url = "http://localhost:11434/api/embeddings"
-        data = json.dumps({
-            "model": OLLAMA_MODEL,
-            "prompt": text
-        }).encode('utf-8')
-
-        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            embedding = result.get("embedding", [])
-
-        return embedding
-    except Exception as e:
-        print(f"⚠️  Warning: Could not get embedding: {e}")
-        return []
+# Phase 1 for databases whose vec_memories still uses the default L2 metric
+# (init_db.py / summarize_day.py rebuild it): exact cosine distance per row
+LEGACY_SEMANTIC_SEARCH_SQL = """
+    SELECT
+        map.memory_uuid,
+        vec_distance_cosine(v.embedding, ?) AS distance
+    FROM vec_memories v
+    JOIN vec_memory_mapping map ON v.rowid = map.vec_rowid
+    ORDER BY distance ASC
+    LIMIT ?
+"""
 
-def cosine_similarity(a, b):
-    """Compute cosine similarity between two vectors"""
+# Phase 2: load display columns for the surviving ids only, applying any
+# date/type filters
+MEMORY_DETAILS_SQL = """
+    SELECT uuid, date, type, summary, importance, metadata
+    FROM memories
+    WHERE uuid IN ({placeholders}){filters}
+"""
+
+CREATE_EMBEDDING_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+        hash TEXT PRIMARY KEY,
+        embedding BLOB NOT NULL
+    )
+"""
+
+STORE_EMBEDDING_SQL = "INSERT OR REPLACE INTO embedding_cache (hash, embedding) VALUES (?, ?)"
+
+def close_connection():
+    """Close the shared database connection (registered with atexit)"""
+    global _conn
+    with _db_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+def get_connection():
+    """Return the shared database connection, opening it on first call (hold _db_lock)"""
+    global _conn, _semantic_search_sql
+    if _conn is not None:
+        return _conn
+
+    # Set up a local connection and publish it only once setup succeeded, so a
+    # failure (locked DB, extension loading) is retried on the next call
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     try:
-        a_np = np.array(a)
-        b_np = np.array(b)
-        return np.dot(a_np, b_np) / (np.linalg.norm(a_np) * np.linalg.norm(b_np))
-    except:
-        return 0.0
-
-def semantic_search(query_embedding, limit=10):
-    """Search memories by semantic similarity using sqlite-vec"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.enable_load_extension(True)
-    sqlite_vec.load(conn)
-    conn.enable_load_extension(False)
-    cursor = conn.cursor()
-
-    # Convert query embedding to numpy array with float32
-    query_array = np.array(query_embedding, dtype=np.float32)
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        conn.execute("PRAGMA journal_mode=WAL")  # no-op if init_db already set it
+        conn.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+        conn.execute("PRAGMA mmap_size=1073741824")  # read pages via mmap (1GB)
+
+        # Query embeddings are cached here too (shared with summarize_day.py)
+        conn.execute(CREATE_EMBEDDING_CACHE_SQL)
+        conn.commit()
+
+        # KNN ranks by the table's declared metric; tables created by older
+        # versions use L2 over unnormalized vectors, so rank those exactly
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'vec_memories'"
+        ).fetchone()
+    except Exception:
+        conn.close()
+        raise
+
+    if row is None or "distance_metric=cosine" in "".join(row[0].split()).lower():
+        _semantic_search_sql = SEMANTIC_SEARCH_SQL
+    else:
+        print("⚠️  Warning: vec_memories uses the legacy L2 metric; run init_db.py to rebuild it "
+              "(falling back to a full cosine scan)", file=sys.stderr)
+        _semantic_search_sql = LEGACY_SEMANTIC_SEARCH_SQL
+    _conn = conn
+    atexit.register(close_connection)
+    return _conn
+
+def embedding_cache_key(text):
+    """Cache key for an embedding: hash of model name + normalized text"""
+    normalized = f"{OLLAMA_MODEL}\0{text.strip()}"
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+def load_cached_embeddings(keys):
+    """Look up embeddings in the embedding_cache table, as {key: float32 array}"""
+    if not keys:
+        return {}
+    placeholders = ",".join("?" * len(keys))
+    try:
+        with _db_lock:
+            rows = get_connection().execute(
+                f"SELECT hash, embedding FROM embedding_cache WHERE hash IN ({placeholders})",
+                keys
+            ).fetchall()
+    except sqlite3.Error:
+        return {}
+    return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+def store_cached_embeddings(items):
+    """Save (key, embedding) pairs to the embedding_cache table in one transaction"""
+    rows = [(key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in items]
+    try:
+        with _db_lock:
+            conn = get_connection()
+            conn.executemany(STORE_EMBEDDING_SQL, rows)
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️  Warning: Could not cache embeddings: {e}", file=sys.stderr)
+
+def ollama_post(path, payload):
+    """POST JSON to Ollama over this thread's keep-alive connection"""
+    body = json_dumps(payload)
+
+    # Retry once on a fresh socket if the kept-alive one was closed by the server
+    for attempt in range(2):
+        conn = getattr(_ollama_local, "conn", None)
+        if conn is None:
+            conn = _ollama_local.conn = http.client.HTTPConnection(
+                OLLAMA_HOST, OLLAMA_PORT, timeout=30
+            )
+        try:
+            conn.request("POST", path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, ConnectionError):
+            conn.close()
+            _ollama_local.conn = None
+            if attempt:
+                raise
+            continue
+
+        if response.status != 200:
+            raise RuntimeError(f"Ollama returned HTTP {response.status}: {data[:200]!r}")
+        return json_loads(data)
+
+def get_embeddings(texts):
+    """
+    Get embeddings for several texts as a (len(texts), dim) float32 array.
+
+    Cached texts are read from embedding_cache; the rest are embedded with a
+    single request to Ollama's batched /api/embed endpoint and cached.
+    Returns an empty (0, dim) array if the embeddings cannot be computed.
+    """
+    keys = [embedding_cache_key(text) for text in texts]
+    found = load_cached_embeddings(list(dict.fromkeys(keys)))
+
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        try:
+            result = ollama_post("/api/embed", {
+                "model": OLLAMA_MODEL,
+                "input": [text_by_key[key].strip() for key in missing]
+            })
+            embeddings = np.asarray(result.get("embeddings", []), dtype=np.float32)
+            if embeddings.shape != (len(missing), EMBEDDING_DIM):
+                raise ValueError(f"unexpected embeddings shape {embeddings.shape}")
+        except Exception as e:
+            print(f"⚠️  Warning: Could not get embedding: {e}", file=sys.stderr)
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+        found.update(zip(missing, embeddings))
+        store_cached_embeddings(zip(missing, embeddings))
+
+    if not keys:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.stack([found[key] for key in keys])
 
-    # Use sqlite-vec to perform vector search with cosine distance
-    # Join through vec_memory_mapping to link vec_rowid <-> memory_uuid
-    cursor.execute("""
-        SELECT
-            m.uuid,
-            m.date,
-            m.type,
-            m.summary,
-            m.importance,
-            m.metadata,
-            vec_distance_cosine(v.embedding, ?) as distance
-        FROM vec_memories v
-        JOIN vec_memory_mapping map ON v.rowid = map.vec_rowid
-        JOIN memories m ON map.memory_uuid = m.uuid
-        WHERE v.embedding IS NOT NULL
-        ORDER BY distance ASC
-        LIMIT ?
-    """, (query_array, limit))
+def get_embedding(text):
+    """Get embedding for a single text (empty array on failure)"""
+    embeddings = get_embeddings([text])
+    return embeddings[0] if len(embeddings) else np.empty(0, dtype=np.float32)
+
+def semantic_search(query_embedding, limit=10, since=None, types=None):
+    """
+    Search memories by semantic similarity using sqlite-vec.
+
+    since (a date/datetime) and types (memory type names) restrict results
+    to memories on or after that date and of those types. Filters are
+    applied to an over-fetched KNN candidate pool, so heavily filtered
+    queries may return fewer than `limit` results.
+    """
+    # Convert query embedding to a unit-length float32 array (stored vectors
+    # are normalized too)
+    query_array = np.array(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(query_array)
+    if norm:
+        query_array /= norm
+
+    filters = ""
+    filter_params = []
+    if since is not None:
+        filters += " AND date >= ?"
+        filter_params.append(since.strftime("%Y-%m-%d"))
+    if types:
+        filters += f" AND type IN ({','.join('?' * len(types))})"
+        filter_params.extend(types)
+
+    k = limit * SEMANTIC_OVERSAMPLE if filters else limit
+
+    with _db_lock:
+        cursor = get_connection().cursor()
+
+        cursor.execute(_semantic_search_sql, (query_array.tobytes(), min(k, SEMANTIC_MAX_K)))
+        ranked = cursor.fetchall()
+        if not ranked:
+            return []
+
+        uuids = [memory_uuid for memory_uuid, _ in ranked]
+        chunk_size = max(1, SQL_MAX_VARIABLES - len(filter_params))
+        details = {}
+        for start in range(0, len(uuids), chunk_size):
+            chunk = uuids[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(
+                MEMORY_DETAILS_SQL.format(placeholders=placeholders, filters=filters),
+                chunk + filter_params
+            )
+            details.update((row[0], row[1:]) for row in cursor.fetchall())
 
     results = []
-    for row in cursor.fetchall():
-        memory_uuid, date, mem_type, summary, importance, metadata_json, distance = row
+    for memory_uuid, distance in ranked:
+        if memory_uuid not in details:
+            continue  # filtered out (or a dangling mapping row)
+        if len(results) == limit:
+            break
+        date, mem_type, summary, importance, metadata_json = details[memory_uuid]
 
-        # Convert cosine distance to similarity: similarity = 1 - distance
-        similarity = 1.0 - distance
+        # Cosine distance ranges over [0, 2]; map it to a [0, 1] similarity
+        similarity = 1.0 - distance / 2.0
 
         # Parse metadata to get tags
         try:
-            metadata = json.loads(metadata_json) if metadata_json else {}
+            metadata = json_loads(metadata_json) if metadata_json else {}
             tags = metadata.get("tags", [])
         except:
             tags = []
@@ -108,156 +428,328 @@ def semantic_search(query_embedding, limit=10):
             "source": "semantic"
         })
 
-    conn.close()
     return results
 
-def keyword_search(query: str, days=3):
-    """Search recent memory files for keywords"""
-    results = []
+def tokenize(text):
+    """
+    Split text into lowercase search tokens.
+
+    Non-CJK words are kept whole; runs of CJK characters (which have no
+    spaces) are split into overlapping bigrams, e.g. "兼容性" -> "兼容", "容性".
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group(0)
+        if _CJK_RE.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+def read_entries(memory_file):
+    """Parse a daily memory file into (header, content) pairs"""
+    content = memory_file.read_text(encoding='utf-8')
+    entries = []
+
+    # Locate header lines with one regex scan and slice the bodies between them
+    headers = list(_ENTRY_RE.finditer(content))
+    for i, match in enumerate(headers):
+        body_start = match.end() + 1
+        body_end = headers[i + 1].start() if i + 1 < len(headers) else len(content)
+        body = content[body_start:body_end]
+        if not body:
+            continue  # header with no lines after it
+        if body.endswith("\n"):
+            body = body[:-1]
+        entries.append((match.group(0).rstrip("\r"), body))
+
+    return entries
+
+def build_day_index(memory_file):
+    """Tokenize every entry of a daily file: [header, content, term frequencies, length]"""
+    entries = []
+    for header, content in read_entries(memory_file):
+        tokens = tokenize(f"{header}\n{content}")
+        entries.append([header, content, dict(Counter(tokens)), len(tokens)])
+    return entries
+
+def load_day_index(memory_file):
+    """
+    Load the tokenized entries of a daily file from its on-disk index.
+
+    The index is keyed by the file's mtime and size and rebuilt when either
+    changes, so the markdown is only re-read and re-tokenized after an edit.
+    """
+    stat = memory_file.stat()
+    index_file = memory_file.with_name(memory_file.stem + KEYWORD_INDEX_SUFFIX)
+
+    try:
+        index = json_loads(index_file.read_bytes())
+        if (index.get("version") == KEYWORD_INDEX_VERSION
+                and index.get("mtime_ns") == stat.st_mtime_ns
+                and index.get("size") == stat.st_size):
+            return index["entries"]
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+
+    entries = build_day_index(memory_file)
+    index = {
+        "version": KEYWORD_INDEX_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "entries": entries
+    }
+    # Write to a temp file and rename so concurrent readers never see a partial
+    # index; the name is unique per process and thread so writers never collide
+    tmp_file = index_file.with_name(
+        f"{index_file.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        tmp_file.write_bytes(json_dumps(index))
+        tmp_file.replace(index_file)
+    except OSError:
+        # read-only memory dir: search still works, just without the cache
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+    return entries
+
+def load_day_corpus(date):
+    """
+    Load one day's memory file as BM25 corpus entries:
+    (date_str, header, content, term frequencies, length)
+    """
+    date_str = date.strftime("%Y-%m-%d")
+    memory_file = MEMORY_DIR / date.strftime("%Y-%m") / f"{date_str}.md"
+
+    if not memory_file.exists():
+        return []
+
+    return [
+        (date_str, header, content, term_freqs, length)
+        for header, content, term_freqs, length in load_day_index(memory_file)
+    ]
+
+def keyword_search(query: str, days=3, limit=10, since=None):
+    """
+    Search recent memory files for keywords, ranked by BM25.
+
+    Only the last `days` daily files are read, and none dated before
+    `since` (a date/datetime) when it is given.
+    """
     today = datetime.now()
 
-    for i in range(days):
-        date = today - timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
-        year_month = date.strftime("%Y-%m")
+    # Collect entries from the recent daily files as the BM25 corpus,
+    # reading the files concurrently
+    dates = [today - timedelta(days=i) for i in range(days)]
+    if since is not None:
+        since_str = since.strftime("%Y-%m-%d")
+        dates = [date for date in dates if date.strftime("%Y-%m-%d") >= since_str]
+        if not dates:
+            return []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(dates), 4))) as pool:
+        corpus = [entry for day in pool.map(load_day_corpus, dates) for entry in day]
+
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not corpus or not query_terms:
+        return []
 
-        memory_file = MEMORY_DIR / year_month / f"{date_str}.md"
+    # Okapi BM25 with a non-negative IDF, scored for all entries at once:
+    # term_freqs is an (entries, query terms) matrix
+    term_freqs = np.array(
+        [[entry[3].get(term, 0) for term in query_terms] for entry in corpus],
+        dtype=np.float64
+    )
+    lengths = np.array([entry[4] for entry in corpus], dtype=np.float64)
 
-        if not memory_file.exists():
-            continue
+    num_docs = len(corpus)
+    avg_length = lengths.mean() or 1.0
+    doc_freq = np.count_nonzero(term_freqs, axis=0)
+    idf = np.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
 
-        # Read file and search for keywords
-        content = memory_file.read_text(encoding='utf-8')
-
-        # Simple keyword matching (split query into terms)
-        query_terms = query.lower().split()
-        entry_matches = []
-
-        current_entry = []
-        current_header = None
-
-        for line in content.splitlines():
-            if line.startswith("## ") and " - " in line:
-                # Save previous entry
-                if current_entry and current_header:
-                    entry_text = "\n".join(current_entry).lower()
-                    # Count matching keywords
-                    match_count = sum(1 for term in query_terms if term in entry_text)
-                    if match_count > 0:
-                        entry_matches.append({
-                            "header": current_header,
-                            "content": "\n".join(current_entry),
-                            "match_count": match_count
-                        })
-
-                current_header = line
-                current_entry = []
-            else:
-                current_entry.append(line)
-
-        # Save last entry
-        if current_entry and current_header:
-            entry_text = "\n".join(current_entry).lower()
-            match_count = sum(1 for term in query_terms if term in entry_text)
-            if match_count > 0:
-                entry_matches.append({
-                    "header": current_header,
-                    "content": "\n".join(current_entry),
-                    "match_count": match_count
-                })
-
-        # Add to results
-        for match in entry_matches:
-            results.append({
-                "date": date_str,
-                "header": match["header"],
-                "summary": match["content"][:200] + "..." if len(match["content"]) > 200 else match["content"],
-                "score": match["match_count"] / len(query_terms),  # Normalized score
-                "source": "keyword"
-            })
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+    scores = (idf * term_freqs * (BM25_K1 + 1) / (term_freqs + length_norm[:, None])).sum(axis=1)
 
-    # Sort by match count
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:10]
+    # Top results by BM25 score (stable, so ties keep file order)
+    ranked = np.argsort(-scores, kind="stable")[:limit]
 
-def merge_results(semantic_results, keyword_results, semantic_weight=0.7):
-    """Merge semantic and keyword results with weighted scoring"""
-    # Use a dictionary to avoid duplicates
+    results = []
+    for i in ranked:
+        if scores[i] <= 0:
+            break
+        date_str, header, content = corpus[i][:3]
+        results.append({
+            "date": date_str,
+            "header": header,
+            "summary": content[:200] + "..." if len(content) > 200 else content,
+            "score": float(scores[i]),
+            "source": "keyword"
+        })
+    return results
+
+def keyword_result_id(result):
+    """Stable id for a keyword hit (daily-file entries have no uuid)"""
+    key = f"{result['date']}\0{result['header']}".encode('utf-8')
+    return "kw-" + hashlib.sha1(key).hexdigest()[:16]
+
+def merge_results(semantic_results, keyword_results, semantic_weight=0.5, k=RRF_K, limit=10):
+    """
+    Merge semantic and keyword results with Reciprocal Rank Fusion.
+
+    Each result list contributes 2 * weight / (k + rank) for every item it
+    ranks (rank starting at 1), so only the order within each list matters
+    and the incomparable cosine and keyword score scales never get mixed.
+    With the default 0.5 / 0.5 split this is plain RRF, 1 / (k + rank), and
+    the top keyword hit ties the top semantic hit. Semantic hits (memory
+    uuids) and keyword hits (daily-file entries) never share an id, so a
+    heavily skewed weight lets one list crowd the other out entirely.
+    Both lists are folded into one dict keyed by result id, so the merge is
+    O(n + m) and only the top `limit` results are selected at the end.
+    """
     merged = {}
 
-    # Add semantic results
-    for result in semantic_results:
-        memory_id = result["id"]
-        merged[memory_id] = {
+    # Add semantic results (keyed by memory uuid)
+    for rank, result in enumerate(semantic_results, 1):
+        merged[result["id"]] = {
             **result,
-            "final_score": result["score"] * semantic_weight
+            "final_score": 2 * semantic_weight / (k + rank)
         }
 
-    # Add keyword results and update scores
-    for result in keyword_results:
-        # Try to find matching semantic result by summary similarity
-        found = False
-        for memory_id, merged_result in merged.items():
-            if result["date"] == merged_result["date"]:
-                # Same date, assume it's the same memory
-                merged[memory_id]["final_score"] += result["score"] * (1 - semantic_weight)
-                merged[memory_id]["keyword_boost"] = True
-                found = True
-                break
-
-        if not found:
-            # New result from keyword search only
-            new_id = f"kw-{result['date']}"
-            merged[new_id] = {
+    # Add keyword results (keyed by date + entry header)
+    for rank, result in enumerate(keyword_results, 1):
+        memory_id = keyword_result_id(result)
+        contribution = 2 * (1 - semantic_weight) / (k + rank)
+
+        if memory_id in merged:
+            merged[memory_id]["final_score"] += contribution
+            merged[memory_id]["keyword_boost"] = True
+        else:
+            merged[memory_id] = {
                 **result,
-                "final_score": result["score"] * (1 - semantic_weight),
+                "id": memory_id,
+                "final_score": contribution,
                 "keyword_boost": False
             }
 
-    # Convert back to list and sort
-    results = list(merged.values())
-    results.sort(key=lambda x: x["final_score"], reverse=True)
+    # Top results by fused score
+    return heapq.nlargest(limit, merged.values(), key=lambda x: x["final_score"])
+
+def hybrid_search(query: str, limit=10, semantic_weight=0.5, since=None, types=None,
+                  log=None):
+    """
+    Run the full hybrid search: embed the query, then fuse semantic and
+    keyword results. Returns None if the query embedding failed.
+
+    The keyword scan is disk-bound and needs no embedding, so it starts in
+    the background while the query is embedded. Results for semantically
+    near-identical queries (same params, cached within SEMANTIC_CACHE_TTL)
+    are served from an in-process cache without waiting for it. `log`, if given, is called with progress messages.
+    since/types filter as in semantic_search(); daily-file entries carry no
+    memory type, so keyword search is skipped when types are given.
+    """
+    log = log or (lambda message: None)
+
+    keyword_future = None
+    if not types:
+        keyword_future = _background_pool.submit(keyword_search, query, limit=limit, since=since)
+
+    log("🧠 Computing query embedding...")
+    query_embedding = get_embedding(query)
+    if query_embedding.size == 0:
+        if keyword_future:
+            keyword_future.cancel()
+        return None
+
+    since_key = since.strftime("%Y-%m-%d") if since is not None else None
+    params = (limit, semantic_weight, since_key, tuple(types or ()))
+    cached = _semantic_cache.get(query_embedding, params)
+    if cached is not None:
+        # Don't wait for the keyword scan; a running one finishes unobserved
+        if keyword_future:
+            keyword_future.cancel()
+        log("⚡ Served from semantic cache\n")
+        return cached
+
+    log("🔎 Semantic search (SQLite)...")
+    semantic_results = semantic_search(query_embedding, limit=limit, since=since, types=types)
+    log(f"   Found {len(semantic_results)} results\n")
+
+    keyword_results = []
+    if keyword_future:
+        log("🔑 Keyword search (recent 3 days)...")
+        keyword_results = keyword_future.result()
+        log(f"   Found {len(keyword_results)} results\n")
+
+    log("🔀 Merging results...")
+    results = merge_results(semantic_results, keyword_results, semantic_weight, limit=limit)
+
+    _semantic_cache.put(query_embedding, params, results)
+    return results
 
-    return results[:10]
+def clear_search_cache():
+    """Forget cached search results; call after writing new memories"""
+    _semantic_cache.clear()
+
+def search(query: str, limit=10, semantic_weight=0.5, since=None, types=None) -> List[Dict]:
+    """
+    Run the full hybrid search in-process.
+
+    Returns the merged results (dicts with 'date', 'summary', 'score',
+    'final_score', ...), or an empty list if the query embedding failed.
+    See hybrid_search() for caching and filters.
+    """
+    results = hybrid_search(query, limit, semantic_weight, since, types)
+    return results if results is not None else []
+
+def parse_since(value):
+    """Parse --since: a relative age like "7d" / "2w", or a YYYY-MM-DD date"""
+    match = re.fullmatch(r"(\d+)([dw])", value)
+    if match:
+        days = int(match.group(1)) * (7 if match.group(2) == "w" else 1)
+        return datetime.now() - timedelta(days=days)
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid --since value: {value!r} (use e.g. 7d, 2w or 2026-01-31)")
 
 def main():
     parser = argparse.ArgumentParser(description="Retrieve memories from database")
     parser.add_argument("--query", required=True, help="Search query")
     parser.add_argument("--limit", type=int, default=10, help="Number of results to return (default: 10)")
-    parser.add_argument("--semantic-weight", type=float, default=0.7, help="Weight for semantic search (0-1)")
+    parser.add_argument("--semantic-weight", type=float, default=0.5, help="Weight for semantic search in RRF fusion (0-1, default: 0.5 = plain RRF)")
+    parser.add_argument("--since", type=parse_since, help="Only memories from this date on: 7d, 2w or YYYY-MM-DD")
+    parser.add_argument("--type", dest="types", action="append", help="Only memories whose stored type label matches exactly (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print results as a JSON array (for programmatic callers)")
     args = parser.parse_args()
 
-    print(f"🔍 Searching for: {args.query}\n")
+    if args.json:
+        # stdout carries only the JSON array; warnings go to stderr
+        results = hybrid_search(args.query, limit=args.limit, semantic_weight=args.semantic_weight,
+                                since=args.since, types=args.types)
+        if results is None:
+            print("❌ Failed to get query embedding", file=sys.stderr)
+            sys.exit(1)
+        print(json_dumps(results).decode('utf-8'))
+        sys.exit(0)
 
-    # Get query embedding
-    print("🧠 Computing query embedding...")
-    query_embedding = get_embedding(args.query)
+    print(f"🔍 Searching for: {args.query}\n")
 
-    if not query_embedding:
+    final_results = hybrid_search(args.query, limit=args.limit, semantic_weight=args.semantic_weight,
+                                  since=args.since, types=args.types, log=print)
+    if final_results is None:
         print("❌ Failed to get query embedding")
         sys.exit(1)
 
-    # Semantic search
-    print("🔎 Semantic search (SQLite)...")
-    semantic_results = semantic_search(query_embedding, limit=args.limit)
-    print(f"   Found {len(semantic_results)} results\n")
-
-    # Keyword search
-    print("🔑 Keyword search (recent 3 days)...")
-    keyword_results = keyword_search(args.query)
-    print(f"   Found {len(keyword_results)} results\n")
-
-    # Merge results
-    print("🔀 Merging results...")
-    final_results = merge_results(semantic_results, keyword_results, args.semantic_weight)
-    final_results = final_results[:args.limit]  # Apply limit after merging
-
     # Display results
     print(f"\n✨ Top {len(final_results)} results:\n")
 
     for i, result in enumerate(final_results, 1):
         tags_str = " ".join(result.get('tags', []))
-        print(f"{i}. [{result['source']}] {result.get('type', 'note')} - Score: {result['final_score']:.3f}")
+        print(f"{i}. [{result['source']}] {result.get('type', 'note')} - Score: {result['final_score']:.4f}")
         print(f"   📅 {result['date']}")
         if tags_str:
             print(f"   🏷️  {tags_str}")